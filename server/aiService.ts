@@ -9,6 +9,16 @@
  */
 
 import * as localEmbedding from "./localEmbedding";
+import {
+  buildNormalizedMatrix,
+  clamp01,
+  clearEmbeddingIndexCache,
+  matVec,
+  normalizeToFloat32,
+  topKIndices,
+  weightedSum,
+} from "./vectorMath";
+import { extractMatchedTerms, queryTermSet } from "./searchTerms";
 
 // ============================================================================
 // Types (unchanged — same contract as before)
@@ -35,7 +45,8 @@ export interface Product {
   review_count?: number | null;
   availability?: string | null;
   stock_quantity?: number | null;
-  embedding?: number[] | null;
+  /** number[] from JSON, or a Float32Array decoded from base64 (see parseEmbedding). */
+  embedding?: ArrayLike<number> | null;
   created_at?: string | null;
 }
 
@@ -100,7 +111,7 @@ export interface EmbeddingHealthReport {
 // Helper: cosine similarity
 // ============================================================================
 
-function cosineSimilarity(a: number[], b: number[]): number {
+function cosineSimilarity(a: ArrayLike<number>, b: ArrayLike<number>): number {
   if (a.length !== b.length) return 0;
   let dot = 0, normA = 0, normB = 0;
   for (let i = 0; i < a.length; i++) {
@@ -108,8 +119,8 @@ function cosineSimilarity(a: number[], b: number[]): number {
     normA += a[i] * a[i];
     normB += b[i] * b[i];
   }
-  const mag = Math.sqrt(normA) * Math.sqrt(normB);
-  return mag === 0 ? 0 : dot / mag;
+  if (normA === 0 || normB === 0) return 0;
+  return dot / Math.sqrt(normA * normB);
 }
 
 // ============================================================================
@@ -123,16 +134,6 @@ function normalizeVector(vec: number[]): number[] {
   return norm > 0 ? vec.map(v => v / norm) : vec;
 }
 
-// ============================================================================
-// Helper: extract matched terms
-// ============================================================================
-
-function extractMatchedTerms(query: string, product: Product): string[] {
-  const queryTerms = query.toLowerCase().split(/\s+/);
-  const productText = `${product.title} ${product.description || ""} ${product.category || ""}`.toLowerCase();
-  return queryTerms.filter(term => term.length > 2 && productText.includes(term));
-}
-
 // ============================================================================
 // Helper: recency score (exponential decay, 180-day half-life)
 // ============================================================================
@@ -185,12 +186,16 @@ function generateExplanation(
 // In-memory product embedding cache (for products without DB embeddings)
 // ============================================================================
 
-const _productEmbeddingCache = new Map<number, number[]>();
+const _productEmbeddingCache = new Map<number, Float32Array>();
 
-async function getOrBuildProductEmbedding(product: Product): Promise<number[]> {
+/**
+ * Resolve a product's embedding. Vectors are returned as-is; callers that
+ * need unit length normalize them when stacking into a matrix.
+ */
+async function getOrBuildProductEmbedding(product: Product): Promise<ArrayLike<number>> {
   // Use precomputed embedding from DB if available
-  if (product.embedding && Array.isArray(product.embedding) && product.embedding.length > 0) {
-    return normalizeVector(product.embedding);
+  if (product.embedding && product.embedding.length > 0) {
+    return product.embedding;
   }
 
   // Check in-memory cache
@@ -207,6 +212,80 @@ async function getOrBuildProductEmbedding(product: Product): Promise<number[]> {
   return vec;
 }
 
+// ============================================================================
+// Helper: non-semantic score factors
+// ============================================================================
+
+const STOCK_SCORES: Record<string, number> = { in_stock: 1.0, low_stock: 0.5, out_of_stock: 0.0 };
+
+/** Struct-of-arrays view of the non-semantic ranking factors. */
+interface RankingFactors {
+  /** Products that passed the filters; index i lines up with every array. */
+  products: Product[];
+  rating: Float32Array;
+  price: Float32Array;
+  stock: Float32Array;
+  recency: Float32Array;
+}
+
+/**
+ * Apply the category / price filters and compute every ranking factor
+ * except the semantic one in a single pass over the catalog. The semantic
+ * factor is produced for all survivors at once by a matrix-vector product.
+ */
+function collectRankingFactors(
+  products: Product[],
+  filters: { category?: string; minPrice?: number; maxPrice?: number },
+): RankingFactors {
+  const cat = filters.category?.toLowerCase();
+  const { minPrice, maxPrice } = filters;
+
+  const kept: Product[] = [];
+  const rating = new Float32Array(products.length);
+  const price = new Float32Array(products.length);
+  const stock = new Float32Array(products.length);
+  const recency = new Float32Array(products.length);
+  let minP = Infinity;
+  let maxP = -Infinity;
+
+  for (const product of products) {
+    if (cat && !(product.category && product.category.toLowerCase().includes(cat))) continue;
+    if (minPrice != null && !(product.price != null && product.price >= minPrice)) continue;
+    if (maxPrice != null && !(product.price != null && product.price <= maxPrice)) continue;
+
+    const i = kept.length;
+    kept.push(product);
+
+    if (product.price != null && product.price > 0) {
+      if (product.price < minP) minP = product.price;
+      if (product.price > maxP) maxP = product.price;
+    }
+    rating[i] = (product.rating || 0) / 5.0;
+    stock[i] = STOCK_SCORES[product.availability || "in_stock"] ?? 0.5;
+    recency[i] = computeRecencyScore(product.created_at);
+  }
+
+  // Price score (lower = better), normalized over the filtered price range
+  if (minP === Infinity) {
+    minP = 0;
+    maxP = 1;
+  }
+  const priceRange = maxP - minP;
+  for (let i = 0; i < kept.length; i++) {
+    const p = kept[i].price;
+    price[i] = p != null && priceRange > 0 ? 1 - (p - minP) / priceRange : 0.5;
+  }
+
+  const n = kept.length;
+  return {
+    products: kept,
+    rating: rating.subarray(0, n),
+    price: price.subarray(0, n),
+    stock: stock.subarray(0, n),
+    recency: recency.subarray(0, n),
+  };
+}
+
 // ============================================================================
 // Public API — drop-in replacements for the old HTTP-based functions
 // ============================================================================
@@ -227,21 +306,22 @@ export async function checkAIServiceHealth(): Promise<boolean> {
  * Generate embedding for a PASSAGE / product text (no query prefix).
  */
 export async function generateEmbedding(text: string): Promise<number[]> {
-  return localEmbedding.generatePassageEmbedding(text);
+  return Array.from(await localEmbedding.generatePassageEmbedding(text));
 }
 
 /**
  * Generate embedding for a SEARCH QUERY (with BGE query prefix).
  */
 export async function generateQueryEmbedding(text: string): Promise<number[]> {
-  return localEmbedding.generateQueryEmbedding(text);
+  return Array.from(await localEmbedding.generateQueryEmbedding(text));
 }
 
 /**
  * Generate embeddings for multiple texts in batch.
  */
 export async function generateBatchEmbeddings(texts: string[]): Promise<number[][]> {
-  return localEmbedding.generateBatchPassageEmbeddings(texts);
+  const vectors = await localEmbedding.generateBatchPassageEmbeddings(texts);
+  return vectors.map(v => Array.from(v));
 }
 
 /**
@@ -274,101 +354,76 @@ export async function semanticSearchViaAI(
   // Generate query embedding (with BGE prefix)
   const queryEmbedding = await localEmbedding.generateQueryEmbedding(query);
 
-  // Apply filters
-  let filtered = products;
-  if (options?.category) {
-    const cat = options.category.toLowerCase();
-    filtered = filtered.filter(p => p.category && p.category.toLowerCase().includes(cat));
-  }
-  if (options?.minPrice != null) {
-    filtered = filtered.filter(p => p.price != null && p.price >= options.minPrice!);
-  }
-  if (options?.maxPrice != null) {
-    filtered = filtered.filter(p => p.price != null && p.price <= options.maxPrice!);
-  }
-
-  // Price range for normalization
-  const allPrices = filtered.map(p => p.price).filter((p): p is number => p != null && p > 0);
-  const minP = allPrices.length > 0 ? Math.min(...allPrices) : 0;
-  const maxP = allPrices.length > 0 ? Math.max(...allPrices) : 1;
-  const priceRange = maxP - minP;
-
-  // Score all products
-  const scored: Array<{ product: Product; breakdown: ScoreBreakdown }> = [];
+  // Apply filters and collect the non-semantic factors in one pass
+  const factors = collectRankingFactors(products, {
+    category: options?.category,
+    minPrice: options?.minPrice,
+    maxPrice: options?.maxPrice,
+  });
+  const filtered = factors.products;
 
+  // Stack all product embeddings into one normalized matrix and score them
+  // against the query with a single matrix-vector product.
+  const productEmbeddings: ArrayLike<number>[] = [];
   for (const product of filtered) {
-    const productEmbedding = await getOrBuildProductEmbedding(product);
-
-    // Semantic score: cosine similarity clamped to [0,1]
-    const rawSim = cosineSimilarity(queryEmbedding, productEmbedding);
-    const semanticScore = Math.max(0, Math.min(1, rawSim));
-
-    // Reject products that are semantically unrelated — prevents high-rated
-    // accessories from outranking genuinely relevant items via the beta/gamma terms.
-    if (options?.minSemanticScore != null && semanticScore < options.minSemanticScore) {
-      continue;
-    }
-
-    // Rating score
-    const ratingScore = (product.rating || 0) / 5.0;
-
-    // Price score (lower = better)
-    let priceScore = 0.5;
-    if (product.price != null && priceRange > 0) {
-      priceScore = 1 - (product.price - minP) / priceRange;
-    }
+    productEmbeddings.push(await getOrBuildProductEmbedding(product));
+  }
+  const matrix = buildNormalizedMatrix(productEmbeddings, queryEmbedding.length);
+  const sims = matVec(matrix, normalizeToFloat32(queryEmbedding));
 
-    // Stock score
-    const stockMap: Record<string, number> = { in_stock: 1.0, low_stock: 0.5, out_of_stock: 0.0 };
-    const stockScore = stockMap[product.availability || "in_stock"] ?? 0.5;
+  const queryTerms = queryTermSet(query);
 
-    // Recency score
-    const recencyScore = computeRecencyScore(product.created_at);
+  // Semantic score: cosine similarity clamped to [0,1]
+  const semantic = clamp01(sims);
 
-    // Final weighted score
-    const finalScore =
-      w.alpha * semanticScore +
-      w.beta * ratingScore +
-      w.gamma * priceScore +
-      w.delta * stockScore +
-      w.epsilon * recencyScore;
+  // Final weighted score: α×Semantic + β×Rating + γ×Price + δ×Stock + ε×Recency
+  const finalScores = weightedSum(
+    [semantic, factors.rating, factors.price, factors.stock, factors.recency],
+    [w.alpha, w.beta, w.gamma, w.delta, w.epsilon],
+  );
 
-    const matchedTerms = extractMatchedTerms(query, product);
+  // Pick the top `limit` by final score without sorting the whole catalog.
+  // Reject products that are semantically unrelated — prevents high-rated
+  // accessories from outranking genuinely relevant items via the beta/gamma terms.
+  const limit = options?.limit || 20;
+  const minSemantic = options?.minSemanticScore;
+  const topIdx = topKIndices(
+    finalScores,
+    limit,
+    minSemantic != null ? i => semantic[i] >= minSemantic : undefined,
+  );
+
+  const results: SearchResult[] = topIdx.map((i, rank) => {
+    const product = filtered[i];
+    const productText = `${product.title} ${product.description || ""} ${product.category || ""}`;
+    const matchedTerms = extractMatchedTerms(queryTerms, productText);
     const explanation = generateExplanation(
       product,
-      { semantic_score: semanticScore, rating_score: ratingScore, price_score: priceScore, stock_score: stockScore },
+      { semantic_score: semantic[i], rating_score: factors.rating[i], price_score: factors.price[i], stock_score: factors.stock[i] },
       matchedTerms,
     );
 
-    scored.push({
+    return {
       product,
-      breakdown: {
-        semantic_score: Math.round(semanticScore * 10000) / 10000,
-        rating_score: Math.round(ratingScore * 10000) / 10000,
-        price_score: Math.round(priceScore * 10000) / 10000,
-        stock_score: Math.round(stockScore * 10000) / 10000,
-        recency_score: Math.round(recencyScore * 10000) / 10000,
-        final_score: Math.round(finalScore * 10000) / 10000,
+      score_breakdown: {
+        semantic_score: Math.round(semantic[i] * 10000) / 10000,
+        rating_score: Math.round(factors.rating[i] * 10000) / 10000,
+        price_score: Math.round(factors.price[i] * 10000) / 10000,
+        stock_score: Math.round(factors.stock[i] * 10000) / 10000,
+        recency_score: Math.round(factors.recency[i] * 10000) / 10000,
+        final_score: Math.round(finalScores[i] * 10000) / 10000,
         matched_terms: matchedTerms,
         explanation,
       },
-    });
-  }
-
-  // Sort by final score descending
-  scored.sort((a, b) => b.breakdown.final_score - a.breakdown.final_score);
-
-  const limit = options?.limit || 20;
-  const results: SearchResult[] = scored.slice(0, limit).map((s, i) => ({
-    product: s.product,
-    score_breakdown: s.breakdown,
-    rank: i + 1,
-  }));
+      rank: rank + 1,
+    };
+  });
 
   return {
     results,
     query,
-    query_embedding: queryEmbedding,
+    // Plain array: JSON/superjson would send a Float32Array as an index-keyed object.
+    query_embedding: Array.from(queryEmbedding),
     total_results: results.length,
     response_time_ms: Date.now() - startTime,
   };
@@ -383,20 +438,27 @@ export async function findSimilarProductsViaAI(
   excludeId?: number,
   limit: number = 5
 ): Promise<SimilarProductsResponse> {
-  const srcVec = normalizeVector(productEmbedding);
-
-  const similarities: Array<{ product: Product; sim: number }> = [];
+  const dim = productEmbedding.length;
 
+  // Products come from the caller, so there is no catalog version to key a
+  // cached index on; stack them into one matrix per call.
+  const candidates: Product[] = [];
+  const candidateEmbeddings: ArrayLike<number>[] = [];
   for (const product of products) {
     if (excludeId != null && product.id === excludeId) continue;
-    const vec = await getOrBuildProductEmbedding(product);
-    const sim = cosineSimilarity(srcVec, vec);
-    similarities.push({ product, sim });
+    candidates.push(product);
+    candidateEmbeddings.push(await getOrBuildProductEmbedding(product));
   }
 
-  similarities.sort((a, b) => b.sim - a.sim);
+  const matrix = buildNormalizedMatrix(candidateEmbeddings, dim);
+  const sims = matVec(matrix, normalizeToFloat32(productEmbedding));
+
+  const similarities = topKIndices(sims, limit).map(i => ({
+    product: candidates[i],
+    sim: sims[i],
+  }));
 
-  const results: SearchResult[] = similarities.slice(0, limit).map((s, i) => {
+  const results: SearchResult[] = similarities.map((s, i) => {
     const normalizedSim = Math.max(0, Math.min(1, s.sim));
     return {
       product: s.product,
@@ -480,6 +542,7 @@ export async function checkEmbeddingHealth(
 export async function clearAIServiceCache(): Promise<{ cleared: boolean; entries: number }> {
   const entries = _productEmbeddingCache.size;
   _productEmbeddingCache.clear();
+  clearEmbeddingIndexCache();
   return { cleared: true, entries };
 }
 
@@ -511,7 +574,7 @@ export function toAIProduct(dbProduct: {
   availability?: string | null;
   stockQuantity?: number | null;
   createdAt?: Date | null;
-  embedding?: number[] | null;
+  embedding?: ArrayLike<number> | null;
 }): Product {
   return {
     id: dbProduct.id,
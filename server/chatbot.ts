@@ -32,6 +32,7 @@ import {
   fromDBWeights,
   type Product as AIProduct,
 } from "./aiService";
+import { parseEmbedding } from "./vectorMath";
 import {
   getAllProductsWithOptionalEmbeddings,
   getActiveRankingWeights,
@@ -203,11 +204,7 @@ async function searchProducts(query: string, limit = 6): Promise<ProductCard[]>
       const aiProducts: AIProduct[] = productsWithEmbeddings.map((row: any) =>
         toAIProduct({
           ...row.product,
-          embedding: row.embedding
-            ? typeof row.embedding === "string"
-              ? JSON.parse(row.embedding)
-              : row.embedding
-            : null,
+          embedding: parseEmbedding(row.embedding),
         }),
       );
       const result = await semanticSearchViaAI(
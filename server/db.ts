@@ -21,6 +21,7 @@ import {
   reviews, InsertReview,
 } from "../drizzle/schema";
 import { ENV } from './_core/env';
+import { l2Normalize } from "./vectorMath";
 
 let _db: any | null = null;
 
@@ -668,11 +669,26 @@ export async function resetUserPassword(userId: number, passwordHash: string): P
 
 // ==================== PRODUCT OPERATIONS ====================
 
+/**
+ * Bumped on every product or embedding write made through this module, so
+ * in-memory catalog caches (such as the similar-products index) know to reload.
+ */
+let _catalogVersion = 0;
+
+export function getCatalogVersion(): number {
+  return _catalogVersion;
+}
+
+function bumpCatalogVersion() {
+  _catalogVersion++;
+}
+
 export async function createProduct(product: InsertProduct) {
   const db = await getDb();
   if (!db) throw new Error("Database not available");
   
   const result = await db.insert(products).values(product).returning({ id: products.id });
+  bumpCatalogVersion();
   return result[0]?.id;
 }
 
@@ -683,6 +699,7 @@ export async function createProducts(productList: InsertProduct[]) {
   if (productList.length === 0) return [];
   
   await db.insert(products).values(productList);
+  bumpCatalogVersion();
   return productList;
 }
 
@@ -839,6 +856,7 @@ export async function updateProduct(id: number, updates: Partial<InsertProduct>)
   if (!db) throw new Error("Database not available");
   
   await db.update(products).set(updates).where(eq(products.id, id));
+  bumpCatalogVersion();
 }
 
 export async function deleteProduct(id: number) {
@@ -846,6 +864,7 @@ export async function deleteProduct(id: number) {
   if (!db) throw new Error("Database not available");
   
   await db.delete(products).where(eq(products.id, id));
+  bumpCatalogVersion();
 }
 
 export async function getCategories() {
@@ -937,27 +956,36 @@ export async function deleteCategory(category: string) {
     .set({ category: null })
     .where(eq(products.category, category))
     .returning({ id: products.id });
+  bumpCatalogVersion();
   return result.length;
 }
 
 // ==================== EMBEDDING OPERATIONS ====================
 
-export async function createEmbedding(embedding: InsertProductEmbedding) {
+export async function createEmbedding(
+  embedding: Omit<InsertProductEmbedding, "embedding"> & { embedding: ArrayLike<number> },
+) {
   const db = await getDb();
   if (!db) throw new Error("Database not available");
   
+  // Stored embeddings are always unit length, so similarity against them
+  // is a plain dot product.
+  const vector = l2Normalize(embedding.embedding);
+
   await db.insert(productEmbeddings).values({
     ...embedding,
+    embedding: vector,
     embeddingModel: embedding.embeddingModel || "BAAI/bge-small-en-v1.5",
   }).onConflictDoUpdate({
     target: productEmbeddings.productId,
     set: {
-      embedding: embedding.embedding,
+      embedding: vector,
       embeddingModel: embedding.embeddingModel || "BAAI/bge-small-en-v1.5",
       textUsed: embedding.textUsed,
       updatedAt: new Date(),
     },
   });
+  bumpCatalogVersion();
 }
 
 export async function createEmbeddings(embeddings: InsertProductEmbedding[]) {
@@ -1,25 +1,103 @@
+import { createHash } from 'node:crypto';
+import { availableParallelism } from 'node:os';
 import { pipeline, env, type FeatureExtractionPipeline } from '@huggingface/transformers';
 
 const MODEL_NAME = 'BAAI/bge-small-en-v1.5';
 const QUERY_PREFIX = 'Represent this sentence for searching relevant passages: ';
 const LRU_MAX_SIZE = 200;
+const PASSAGE_CACHE_MAX_SIZE = 10_000;
+
+const EMBEDDING_DTYPES = ['fp32', 'fp16', 'q8', 'int8', 'uint8', 'q4'] as const;
+type EmbeddingDtype = (typeof EMBEDDING_DTYPES)[number];
+
+/**
+ * ONNX weights to load. fp32 is the default: every stored product vector
+ * and the score thresholds downstream were produced with it. Quantized
+ * weights (e.g. q8) are faster on CPU but opt-in until they have been
+ * measured against those thresholds.
+ */
+function resolveDtype(raw: string | undefined): EmbeddingDtype {
+  if (!raw) return 'fp32';
+  if ((EMBEDDING_DTYPES as readonly string[]).includes(raw)) return raw as EmbeddingDtype;
+  console.warn(
+    `[localEmbedding] Unknown EMBEDDING_DTYPE "${raw}" (expected one of ${EMBEDDING_DTYPES.join(', ')}), using fp32.`,
+  );
+  return 'fp32';
+}
+
+const MODEL_DTYPE = resolveDtype(process.env.EMBEDDING_DTYPE);
+
+/** Weights actually loaded; differs from MODEL_DTYPE after an fp32 fallback. */
+let loadedDtype: EmbeddingDtype | null = null;
+
+/**
+ * ONNX Runtime intra-op threads. Set explicitly so inference uses every
+ * core the container is allowed, rather than whatever ORT guesses.
+ */
+const INTRA_OP_THREADS = Number(process.env.EMBEDDING_THREADS) || availableParallelism();
+const INTER_OP_THREADS = 2;
 
 // ---------------------------------------------------------------------------
 // Lazy singleton pipeline
 // ---------------------------------------------------------------------------
+
+/**
+ * How long a failed model load is remembered. Until it expires, callers
+ * (e.g. the per-message health check) fail fast instead of re-downloading
+ * and re-loading the model every time.
+ */
+const LOAD_FAILURE_BACKOFF_MS = 60_000;
+
 let extractorPromise: Promise<FeatureExtractionPipeline> | null = null;
 
+async function loadExtractor(): Promise<FeatureExtractionPipeline> {
+  console.log(
+    `[localEmbedding] Loading model ${MODEL_NAME} (${MODEL_DTYPE}, ${INTRA_OP_THREADS} threads)...`,
+  );
+  env.allowLocalModels = true;
+  const session_options = {
+    intraOpNumThreads: INTRA_OP_THREADS,
+    interOpNumThreads: INTER_OP_THREADS,
+  };
+  let extractor: FeatureExtractionPipeline;
+  let dtype: EmbeddingDtype = MODEL_DTYPE;
+  try {
+    extractor = await pipeline('feature-extraction', MODEL_NAME, {
+      dtype,
+      session_options,
+    });
+  } catch (error) {
+    if (MODEL_DTYPE === 'fp32') throw error;
+    // Not every model repo ships quantized ONNX weights
+    console.warn(
+      `[localEmbedding] ${MODEL_DTYPE} weights unavailable for ${MODEL_NAME}, falling back to fp32:`,
+      error instanceof Error ? error.message : error,
+    );
+    dtype = 'fp32';
+    extractor = await pipeline('feature-extraction', MODEL_NAME, {
+      dtype,
+      session_options,
+    });
+  }
+  loadedDtype = dtype;
+  console.log(`[localEmbedding] Model ${MODEL_NAME} loaded successfully.`);
+  return extractor;
+}
+
+/**
+ * Return the pipeline, loading it on first use. Concurrent callers share one
+ * load. A failed load keeps rejecting for LOAD_FAILURE_BACKOFF_MS, then the
+ * next call retries.
+ */
 function getExtractor(): Promise<FeatureExtractionPipeline> {
   if (!extractorPromise) {
-    extractorPromise = (async () => {
-      console.log(`[localEmbedding] Loading model ${MODEL_NAME}...`);
-      env.allowLocalModels = true;
-      const extractor = await pipeline('feature-extraction', MODEL_NAME, {
-        dtype: 'fp32',
-      });
-      console.log(`[localEmbedding] Model ${MODEL_NAME} loaded successfully.`);
-      return extractor;
-    })();
+    const loading = loadExtractor();
+    extractorPromise = loading;
+    loading.catch(() => {
+      setTimeout(() => {
+        if (extractorPromise === loading) extractorPromise = null;
+      }, LOAD_FAILURE_BACKOFF_MS).unref();
+    });
   }
   return extractorPromise;
 }
@@ -58,15 +136,38 @@ class LRUCache<K, V> {
   }
 }
 
-const queryCache = new LRUCache<string, number[]>(LRU_MAX_SIZE);
+const queryCache = new LRUCache<string, Float32Array>(LRU_MAX_SIZE);
+const passageCache = new LRUCache<string, Float32Array>(PASSAGE_CACHE_MAX_SIZE);
+
+/**
+ * Cache key for a text: 128-bit BLAKE2b digest, so long product
+ * descriptions don't sit in memory as map keys.
+ */
+function contentKey(text: string): string {
+  return createHash('blake2b512').update(text).digest().subarray(0, 16).toString('base64');
+}
 
 // ---------------------------------------------------------------------------
 // Core embedding helper
 // ---------------------------------------------------------------------------
-async function embed(texts: string | string[]): Promise<number[][]> {
+/**
+ * Run the model and split its (batch × dim) float32 output into one
+ * Float32Array per text. Each row is copied so cached vectors don't keep the
+ * whole batch tensor alive, and nothing is widened to float64 number[]s.
+ */
+async function embed(texts: string | string[]): Promise<Float32Array[]> {
   const extractor = await getExtractor();
-  const result = await extractor(texts, { pooling: 'cls', normalize: true });
-  return result.tolist() as number[][];
+  const output = await extractor(texts, { pooling: 'cls', normalize: true });
+  // fp16 exports produce half-precision output; widen those to float32 only
+  const result = output.type === 'float32' ? output : output.to('float32');
+  const data = result.data as Float32Array;
+
+  const [rows, dim] = result.dims;
+  const vectors: Float32Array[] = new Array(rows);
+  for (let r = 0; r < rows; r++) {
+    vectors[r] = data.slice(r * dim, (r + 1) * dim);
+  }
+  return vectors;
 }
 
 // ---------------------------------------------------------------------------
@@ -76,8 +177,15 @@ async function embed(texts: string | string[]): Promise<number[][]> {
 /**
  * Generate an embedding for a passage / product text (no prefix).
  */
-export async function generatePassageEmbedding(text: string): Promise<number[]> {
+export async function generatePassageEmbedding(text: string): Promise<Float32Array> {
+  const key = contentKey(text);
+  const cached = passageCache.get(key);
+  if (cached) {
+    return cached;
+  }
+
   const [vector] = await embed(text);
+  passageCache.set(key, vector);
   return vector;
 }
 
@@ -85,24 +193,48 @@ export async function generatePassageEmbedding(text: string): Promise<number[]>
  * Generate an embedding for a search query.
  * Prepends the BGE query prefix and caches the result.
  */
-export async function generateQueryEmbedding(text: string): Promise<number[]> {
-  const cached = queryCache.get(text);
+export async function generateQueryEmbedding(text: string): Promise<Float32Array> {
+  const key = contentKey(text);
+  const cached = queryCache.get(key);
   if (cached) {
     return cached;
   }
 
   const prefixed = `${QUERY_PREFIX}${text}`;
   const [vector] = await embed(prefixed);
-  queryCache.set(text, vector);
+  queryCache.set(key, vector);
   return vector;
 }
 
 /**
  * Generate embeddings for multiple passages in a single batch call.
+ * Cached texts are served from the passage cache; only the misses
+ * (deduplicated) go through the model.
  */
-export async function generateBatchPassageEmbeddings(texts: string[]): Promise<number[][]> {
+export async function generateBatchPassageEmbeddings(texts: string[]): Promise<Float32Array[]> {
   if (texts.length === 0) return [];
-  return embed(texts);
+
+  const keys = texts.map(contentKey);
+  const results: (Float32Array | undefined)[] = keys.map(key => passageCache.get(key));
+
+  const missIndexByKey = new Map<string, number>();
+  const missTexts: string[] = [];
+  keys.forEach((key, i) => {
+    if (results[i] === undefined && !missIndexByKey.has(key)) {
+      missIndexByKey.set(key, missTexts.length);
+      missTexts.push(texts[i]);
+    }
+  });
+
+  if (missTexts.length > 0) {
+    const fresh = await embed(missTexts);
+    missIndexByKey.forEach((missIdx, key) => passageCache.set(key, fresh[missIdx]));
+    keys.forEach((key, i) => {
+      if (results[i] === undefined) results[i] = fresh[missIndexByKey.get(key)!];
+    });
+  }
+
+  return results as Float32Array[];
 }
 
 /**
@@ -130,3 +262,14 @@ export async function preloadModel(): Promise<void> {
 export function getModelName(): string {
   return MODEL_NAME;
 }
+
+/**
+ * Identifier stored with each embedding (product_embeddings.embedding_model).
+ * fp32 vectors keep the bare model name, as every existing row has; other
+ * weights are suffixed with their dtype (e.g. `BAAI/bge-small-en-v1.5@q8`)
+ * so vectors from different weights can be told apart.
+ */
+export function getEmbeddingModelId(): string {
+  const dtype = loadedDtype ?? MODEL_DTYPE;
+  return dtype === 'fp32' ? MODEL_NAME : `${MODEL_NAME}@${dtype}`;
+}
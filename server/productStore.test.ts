@@ -0,0 +1,49 @@
+import { describe, expect, it } from "vitest";
+import { AVAILABILITY_CODE, buildProductStore } from "./productStore";
+import { encodeFloat32Base64 } from "./vectorMath";
+import type { Product } from "../drizzle/schema";
+
+function product(id: number, fields: Partial<Product>): Product {
+  return { id, title: `Product ${id}`, ...fields } as Product;
+}
+
+describe("Product Store", () => {
+  const embedding = Array.from({ length: 384 }, (_, i) => (i === 0 ? 3 : i === 1 ? 4 : 0));
+
+  const store = buildProductStore([
+    { product: product(1, { price: "19.99", rating: "4.5", availability: "in_stock" }), embedding },
+    { product: product(2, { price: "250", rating: null, availability: "out_of_stock" }), embedding: null },
+    { product: product(3, { price: "5", rating: "0", availability: "low_stock" }), embedding: encodeFloat32Base64(embedding) },
+  ]);
+
+  it("lays out one row per product", () => {
+    expect(store.products.map(p => p.id)).toEqual([1, 2, 3]);
+    expect(store.prices[0]).toBe(19.99);
+    expect(store.maxPrice).toBe(250);
+    expect(store.embeddings.rows).toBe(3);
+    expect(store.embeddings.dim).toBe(384);
+  });
+
+  it("keeps missing ratings distinguishable from zero", () => {
+    expect(store.ratings[0]).toBe(4.5);
+    expect(Number.isNaN(store.ratings[1])).toBe(true);
+    expect(store.ratings[2]).toBe(0);
+  });
+
+  it("encodes availability as compact codes", () => {
+    expect(Array.from(store.availabilities)).toEqual([
+      AVAILABILITY_CODE.in_stock,
+      AVAILABILITY_CODE.out_of_stock,
+      AVAILABILITY_CODE.low_stock,
+    ]);
+  });
+
+  it("stores normalized embeddings and zero rows where missing", () => {
+    const { data, dim } = store.embeddings;
+
+    expect(data[0]).toBeCloseTo(0.6, 5);
+    expect(data[1]).toBeCloseTo(0.8, 5);
+    expect(data.subarray(dim, 2 * dim).every(v => v === 0)).toBe(true);
+    expect(data[2 * dim]).toBeCloseTo(0.6, 5);
+  });
+});
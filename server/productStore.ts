@@ -0,0 +1,124 @@
+import { getAllProductsWithOptionalEmbeddings, getCatalogVersion } from "./db";
+import { buildNormalizedMatrix, parseEmbedding, type EmbeddingMatrix } from "./vectorMath";
+import type { Product } from "../drizzle/schema";
+
+/**
+ * Embedding dimension for the BGE-small-en-v1.5 model.
+ */
+const EMBEDDING_DIMENSION = 384;
+
+/** Same catalog cap semantic search has always used. */
+const STORE_MAX_PRODUCTS = 5000;
+
+/**
+ * Upper bound on snapshot age. Writes made through db.ts invalidate the
+ * snapshot immediately; this only covers writes from other processes
+ * (seed scripts, a second instance).
+ */
+const STORE_MAX_AGE_MS = 5 * 60 * 1000;
+
+/** Availability enum → compact code stored per row. */
+export const AVAILABILITY_CODE = {
+  unknown: 0,
+  in_stock: 1,
+  low_stock: 2,
+  out_of_stock: 3,
+} as const;
+
+/**
+ * Column-oriented snapshot of the catalog, loaded once from the database
+ * and shared by every search. Row `r` of each column describes
+ * `products[r]`.
+ */
+export interface ProductStore {
+  products: Product[];
+  /** L2-normalized embeddings (rows × 384); zero rows where missing. */
+  embeddings: EmbeddingMatrix;
+  /** Float64 so price filters compare exactly against user input. */
+  prices: Float64Array;
+  /** Raw 0–5 rating; NaN when the product has none. */
+  ratings: Float32Array;
+  availabilities: Int8Array;
+  /** Highest price in the catalog (at least 1), for price normalization. */
+  maxPrice: number;
+  /** db.ts catalog version the snapshot was loaded at. */
+  version: number;
+  loadedAt: number;
+}
+
+let store: ProductStore | null = null;
+let loading: Promise<ProductStore> | null = null;
+
+/**
+ * Build a store from `getAllProductsWithOptionalEmbeddings` rows.
+ */
+export function buildProductStore(
+  rows: ReadonlyArray<{ product: Product; embedding: unknown }>,
+  version = 0,
+): ProductStore {
+  const n = rows.length;
+  const products: Product[] = new Array(n);
+  const prices = new Float64Array(n);
+  const ratings = new Float32Array(n);
+  const availabilities = new Int8Array(n);
+  const embeddings: (ArrayLike<number> | null)[] = new Array(n);
+  let maxPrice = 1;
+
+  for (let r = 0; r < n; r++) {
+    const { product, embedding } = rows[r];
+    products[r] = product;
+    const price = Number(product.price) || 0;
+    prices[r] = price;
+    if (price > maxPrice) maxPrice = price;
+    ratings[r] = product.rating ? Number(product.rating) : NaN;
+    availabilities[r] = AVAILABILITY_CODE[product.availability ?? "unknown"] ?? AVAILABILITY_CODE.unknown;
+    embeddings[r] = parseEmbedding(embedding);
+  }
+
+  return {
+    products,
+    embeddings: buildNormalizedMatrix(embeddings, EMBEDDING_DIMENSION),
+    prices,
+    ratings,
+    availabilities,
+    maxPrice,
+    version,
+    loadedAt: Date.now(),
+  };
+}
+
+/**
+ * The current catalog snapshot, reloading it when the catalog has been
+ * written to since it was loaded. Concurrent callers share one load.
+ */
+export async function getProductStore(): Promise<ProductStore> {
+  if (
+    store &&
+    store.version === getCatalogVersion() &&
+    Date.now() - store.loadedAt < STORE_MAX_AGE_MS
+  ) {
+    return store;
+  }
+
+  if (!loading) {
+    const version = getCatalogVersion();
+    loading = getAllProductsWithOptionalEmbeddings(STORE_MAX_PRODUCTS, 0)
+      .then(rows => {
+        store = buildProductStore(rows, version);
+        return store;
+      })
+      .finally(() => {
+        loading = null;
+      });
+  }
+  return loading;
+}
+
+/**
+ * Drop the snapshot so the next search reloads it from the database.
+ */
+export function invalidateProductStore(): { entries: number } {
+  const entries = store?.products.length ?? 0;
+  store = null;
+  return { entries };
+}
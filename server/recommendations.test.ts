@@ -1,4 +1,18 @@
-import { describe, expect, it } from "vitest";
+import { beforeEach, describe, expect, it, vi } from "vitest";
+import * as db from "./db";
+import { getSessionRecommendations, getSimilarProducts } from "./recommendations";
+import { clearEmbeddingIndexCache } from "./vectorMath";
+
+vi.mock("./db", () => ({
+  getSessionInteractions: vi.fn(),
+  getProductsByIds: vi.fn(async () => []),
+  getProductsWithEmbeddings: vi.fn(),
+  getEmbeddingByProductId: vi.fn(),
+  getFeaturedProducts: vi.fn(async () => []),
+  getCoVisitedProducts: vi.fn(async () => []),
+  getTopInteractedProductIds: vi.fn(async () => []),
+  getCatalogVersion: vi.fn(() => 0),
+}));
 
 describe("Recommendations Engine", () => {
   describe("Interaction Weights", () => {
@@ -219,4 +233,54 @@ describe("Recommendations Engine", () => {
       expect(sorted[2].id).toBe(1);
     });
   });
+
+  describe("Catalog Index Path", () => {
+    const embeddings: Record<number, number[]> = {
+      1: [1, 0, 0],
+      2: [0.9, 0.1, 0],
+      3: [0, 1, 0],
+      4: [0.8, 0.2, 0],
+      5: [0.95, 0, 0.05],
+    };
+    const catalog = Object.entries(embeddings).map(([id, embedding]) => ({
+      product: { id: Number(id), title: `Product ${id}` },
+      embedding,
+    }));
+
+    beforeEach(() => {
+      clearEmbeddingIndexCache();
+      vi.mocked(db.getCatalogVersion).mockReturnValue(0);
+      vi.mocked(db.getProductsWithEmbeddings).mockReset().mockResolvedValue(catalog as any);
+      vi.mocked(db.getEmbeddingByProductId).mockImplementation(
+        async (productId: number) => ({ productId, embedding: embeddings[productId] }) as any
+      );
+      vi.mocked(db.getSessionInteractions).mockResolvedValue([
+        { productId: 1, interactionType: "view" },
+      ] as any);
+    });
+
+    it("ranks session recommendations by similarity to interacted products", async () => {
+      const recs = await getSessionRecommendations("session-1", { limit: 2 });
+
+      expect(recs.map(r => r.product.id)).toEqual([5, 2]);
+      expect(recs[0].sourceProductId).toBe(1);
+    });
+
+    it("returns similar products best first, excluding the source", async () => {
+      const recs = await getSimilarProducts(1, 3);
+
+      expect(recs.map(r => r.product.id)).toEqual([5, 2, 4]);
+      expect(recs[0].score).toBeCloseTo(0.95 / Math.hypot(0.95, 0.05), 5);
+    });
+
+    it("refetches the catalog only when its version changes", async () => {
+      await getSimilarProducts(1, 3);
+      await getSessionRecommendations("session-1", { limit: 2 });
+      expect(db.getProductsWithEmbeddings).toHaveBeenCalledTimes(1);
+
+      vi.mocked(db.getCatalogVersion).mockReturnValue(1);
+      await getSimilarProducts(1, 3);
+      expect(db.getProductsWithEmbeddings).toHaveBeenCalledTimes(2);
+    });
+  });
 });
@@ -6,8 +6,15 @@ import {
   getFeaturedProducts,
   getCoVisitedProducts,
   getTopInteractedProductIds,
+  getCatalogVersion,
 } from "./db";
-import { cosineSimilarity } from "./semanticSearch";
+import {
+  getEmbeddingIndex,
+  matVec,
+  normalizeToFloat32,
+  searchIndex,
+  type EmbeddingIndex,
+} from "./vectorMath";
 import type { Product, Interaction } from "../drizzle/schema";
 
 export interface RecommendationResult {
@@ -28,6 +35,20 @@ function rescaleCosine(sim: number): number {
   return Math.max(0, Math.min(1, sim));
 }
 
+/**
+ * Index over every product with a stored embedding, cached per catalog
+ * version so repeat calls skip both the DB fetch and the normalization.
+ */
+function getCatalogIndex(dim: number): Promise<EmbeddingIndex<{ id: number; embedding: number[]; product: Product }>> {
+  return getEmbeddingIndex(`products-with-embeddings:${getCatalogVersion()}`, dim, async () =>
+    (await getProductsWithEmbeddings()).map((row: { product: Product; embedding: number[] }) => ({
+      id: row.product.id,
+      embedding: row.embedding,
+      product: row.product,
+    }))
+  );
+}
+
 /**
  * Get session-based recommendations ("You may also like").
  *
@@ -106,20 +127,27 @@ export async function getSessionRecommendations(
   const excludeSet = new Set([...excludeProductIds, ...interactedProductIds]);
 
   if (interactedEmbeddings.length > 0) {
-    const allProducts = await getProductsWithEmbeddings();
+    // The cached index holds unit-length rows, so each interacted product
+    // costs one matrix-vector product of plain dot products over the whole
+    // catalog — no per-pair norms.
+    const index = await getCatalogIndex(interactedEmbeddings[0].embedding.length);
+    const simsByInteracted = interactedEmbeddings.map(interacted =>
+      matVec(index.matrix, normalizeToFloat32(interacted.embedding))
+    );
 
     const recommendations: RecommendationResult[] = [];
 
-    for (const { product, embedding } of allProducts) {
-      if (excludeSet.has(product.id) || !embedding) continue;
+    for (let row = 0; row < index.entries.length; row++) {
+      const { product } = index.entries[row];
+      if (excludeSet.has(product.id)) continue;
 
       // Calculate weighted similarity to interacted products
       let totalScore = 0;
       let bestMatch = { productId: 0, similarity: 0 };
 
-      for (const interacted of interactedEmbeddings) {
-        const rawSim = cosineSimilarity(embedding as number[], interacted.embedding);
-        const sim = rescaleCosine(rawSim);
+      for (let j = 0; j < interactedEmbeddings.length; j++) {
+        const interacted = interactedEmbeddings[j];
+        const sim = rescaleCosine(simsByInteracted[j][row]);
         const weightedSimilarity = sim * interacted.score;
         totalScore += weightedSimilarity;
 
@@ -249,31 +277,26 @@ export async function getSimilarProducts(
     return getCategoryBasedRecommendations(productId, limit);
   }
 
-  const allProducts = await getProductsWithEmbeddings();
+  const sourceEmbedding = productEmbedding.embedding as number[];
+
+  // Nearest neighbours from the cached, pre-normalized catalog index; it is
+  // refetched and rebuilt only when the catalog or its embeddings change.
+  const index = await getCatalogIndex(sourceEmbedding.length);
   const recommendations: RecommendationResult[] = [];
 
-  for (const { product, embedding } of allProducts) {
-    if (product.id === productId || !embedding) continue;
+  for (const hit of searchIndex(index, sourceEmbedding, limit, productId)) {
+    const similarity = rescaleCosine(hit.sim);
+    if (similarity <= 0.35) break;
 
-    const rawSim = cosineSimilarity(
-      productEmbedding.embedding as number[],
-      embedding as number[],
-    );
-    const similarity = rescaleCosine(rawSim);
-
-    if (similarity > 0.35) {
-      recommendations.push({
-        product,
-        score: similarity,
-        reason: `${(similarity * 100).toFixed(0)}% similar`,
-        sourceProductId: productId,
-      });
-    }
+    recommendations.push({
+      product: index.entries[hit.row].product,
+      score: similarity,
+      reason: `${(similarity * 100).toFixed(0)}% similar`,
+      sourceProductId: productId,
+    });
   }
 
-  return recommendations
-    .sort((a, b) => b.score - a.score)
-    .slice(0, limit);
+  return recommendations;
 }
 
 /**
@@ -68,6 +68,7 @@ import { getSessionRecommendations, getSimilarProducts, getTrendingProducts } fr
 import { evaluateSearchQuery, calculateAllMetrics, generateAutoRelevanceJudgments, type SearchResult } from "./irMetrics";
 import { notifyOwner } from "./_core/notification";
 import { handleChatMessage } from "./chatbot";
+import { encodeFloat32Base64 } from "./vectorMath";
 import type { Product, SearchLog } from "../drizzle/schema";
 
 // Session cookie name for anonymous tracking
@@ -328,9 +329,22 @@ export const appRouter = router({
     }),
 
     logs: adminProcedure
-      .input(z.object({ limit: z.number().min(1).max(500).default(100) }).optional())
+      .input(z.object({
+        limit: z.number().min(1).max(500).default(100),
+        // "array" (default) returns each query embedding as a 384-number
+        // JSON array. "base64" opts into packed float32 bytes (~2 KB) in
+        // queryEmbeddingB64, with queryEmbedding set to null.
+        embeddingFormat: z.enum(["array", "base64"]).default("array"),
+      }).optional())
       .query(async ({ input }) => {
-        return getSearchLogs(input?.limit || 100);
+        const logs = await getSearchLogs(input?.limit || 100);
+        if (input?.embeddingFormat !== "base64") return logs;
+
+        return logs.map((log: SearchLog) => ({
+          ...log,
+          queryEmbedding: null,
+          queryEmbeddingB64: log.queryEmbedding ? encodeFloat32Base64(log.queryEmbedding) : null,
+        }));
       }),
   }),
 
@@ -577,6 +591,7 @@ export const appRouter = router({
           success: true,
           clearedEntries: local.entries + remote.entries,
           localCacheCleared: true,
+          productStoreEntries: local.productStoreEntries,
           aiServiceCleared: remote.cleared,
           aiServiceEntries: remote.entries,
         };
@@ -0,0 +1,15 @@
+import { describe, expect, it } from "vitest";
+import { extractMatchedTerms, queryTermSet } from "./searchTerms";
+
+describe("Search Terms", () => {
+  it("keeps non-ASCII words whole", () => {
+    expect(Array.from(queryTermSet("Crème brûlée set"))).toEqual(["crème", "brûlée", "set"]);
+    expect(extractMatchedTerms(queryTermSet("brûlée torch"), "Crème Brûlée Torch")).toEqual(["brûlée", "torch"]);
+  });
+
+  it("matches whole words only", () => {
+    const terms = queryTermSet("wireless headphones");
+    expect(extractMatchedTerms(terms, "Wireless Headphones")).toEqual(["wireless", "headphones"]);
+    expect(extractMatchedTerms(terms, "Wired Headphone Stand")).toEqual([]);
+  });
+});
@@ -0,0 +1,29 @@
+/**
+ * Query-term matching used to explain search results.
+ */
+
+/** Unicode word characters, so "café" or "été" stay whole words. */
+const WORD_PATTERN = /[\p{L}\p{N}_]+/gu;
+
+function wordTokens(text: string): string[] {
+  return text.toLowerCase().match(WORD_PATTERN) || [];
+}
+
+/**
+ * Distinct query words longer than two characters. Computed once per search.
+ */
+export function queryTermSet(query: string): Set<string> {
+  return new Set(wordTokens(query).filter(t => t.length > 2));
+}
+
+/**
+ * The query terms that appear as whole words in a product's text.
+ */
+export function extractMatchedTerms(queryTerms: Set<string>, productText: string): string[] {
+  const tokens = new Set(wordTokens(productText));
+  const matched: string[] = [];
+  queryTerms.forEach(term => {
+    if (tokens.has(term)) matched.push(term);
+  });
+  return matched;
+}
@@ -1,5 +1,4 @@
 import {
-  getAllProductsWithOptionalEmbeddings,
   getActiveRankingWeights,
   logSearch,
   saveSearchExplanations,
@@ -8,14 +7,17 @@ import {
   getProductsByIds,
 } from "./db";
 import * as localEmbedding from "./localEmbedding";
+import { AVAILABILITY_CODE, getProductStore, invalidateProductStore } from "./productStore";
+import { extractMatchedTerms, queryTermSet } from "./searchTerms";
+import {
+  clamp01,
+  matVecRows,
+  normalizeToFloat32,
+  topKIndices,
+  weightedSum,
+} from "./vectorMath";
 import type { Product, RankingWeight } from "../drizzle/schema";
 
-/** Shape returned by getAllProductsWithOptionalEmbeddings */
-interface ProductWithEmbedding {
-  product: Product;
-  embedding: number[] | null;
-}
-
 /** Shape produced by the scoring loop inside semanticSearch */
 interface ScoredProduct {
   product: Product;
@@ -83,16 +85,18 @@ let vocabularySize = 0;
 let corpusBuilt = false;
 
 /**
- * Reset the in-memory TF-IDF corpus cache. Called from the admin
- * "Clear Search Cache" action so the next search rebuilds IDFs from the
- * latest catalog.
+ * Reset the in-memory TF-IDF corpus cache (and catalog snapshot). Called
+ * from the admin "Clear Search Cache" action so the next search reloads the
+ * catalog and rebuilds IDFs from it. Reports IDF entries and snapshot
+ * products separately.
  */
-export function resetCorpusCache(): { entries: number } {
+export function resetCorpusCache(): { entries: number; productStoreEntries: number } {
   const entries = idfDict.size;
+  const productStoreEntries = invalidateProductStore().entries;
   idfDict = new Map();
   vocabularySize = 0;
   corpusBuilt = false;
-  return { entries };
+  return { entries, productStoreEntries };
 }
 
 /**
@@ -191,7 +195,7 @@ function generateTFIDFVector(text: string, targetDim: number = EMBEDDING_DIMENSI
  * ("Represent this sentence for searching relevant passages: "). No
  * external Python service required.
  */
-export async function generateEmbedding(text: string): Promise<number[]> {
+export async function generateEmbedding(text: string): Promise<Float32Array> {
   return localEmbedding.generateQueryEmbedding(text);
 }
 
@@ -257,26 +261,30 @@ export function cosineSimilarity(a: number[], b: number[]): number {
     normB += b[i] * b[i];
   }
 
-  const magnitude = Math.sqrt(normA) * Math.sqrt(normB);
-  if (magnitude === 0) return 0;
-
-  return dotProduct / magnitude;
-}
-
-/**
- * Extract matched terms between query and product text.
- */
-function extractMatchedTerms(query: string, productText: string): string[] {
-  const queryTerms = query.toLowerCase().split(/\s+/).filter(t => t.length > 2);
-  const productLower = productText.toLowerCase();
+  if (normA === 0 || normB === 0) return 0;
 
-  return queryTerms.filter(term => productLower.includes(term));
+  // One sqrt of the product instead of multiplying two separate roots.
+  return dotProduct / Math.sqrt(normA * normB);
 }
 
 // ============================================================================
 // Hybrid search: exact match boost
 // ============================================================================
 
+/** A query lowercased and split once per search, for computeKeywordScore. */
+interface KeywordQuery {
+  text: string;
+  tokens: string[];
+  /** Number of distinct tokens. */
+  distinct: number;
+}
+
+function toKeywordQuery(query: string): KeywordQuery {
+  const text = query.toLowerCase().trim();
+  const tokens = text.split(/\s+/).filter(t => t.length > 1 && !STOP_WORDS.has(t));
+  return { text, tokens, distinct: new Set(tokens).size };
+}
+
 /**
  * Compute a keyword/exact-match score for a product against a query.
  *
@@ -290,8 +298,8 @@ function extractMatchedTerms(query: string, productText: string): string[] {
  * name searches always rank the correct product first, even if something
  * else is semantically close.
  */
-function computeKeywordScore(query: string, product: { title: string; description?: string | null; category?: string | null }): number {
-  const q = query.toLowerCase().trim();
+function computeKeywordScore(query: KeywordQuery, product: { title: string; description?: string | null; category?: string | null }): number {
+  const { text: q, tokens: qTokensArr, distinct } = query;
   const title = product.title.toLowerCase().trim();
 
   // Exact title match → maximum boost
@@ -304,12 +312,10 @@ function computeKeywordScore(query: string, product: { title: string; descriptio
   if (q.includes(title)) return 0.80;
 
   // Token-level overlap (Jaccard similarity on title)
-  const qTokensArr = q.split(/\s+/).filter(t => t.length > 1 && !STOP_WORDS.has(t));
   const titleTokensArr = title.split(/\s+/).filter(t => t.length > 1 && !STOP_WORDS.has(t));
-  const qTokens = new Set(qTokensArr);
   const titleTokens = new Set(titleTokensArr);
 
-  if (qTokens.size === 0 || titleTokens.size === 0) return 0;
+  if (distinct === 0 || titleTokens.size === 0) return 0;
 
   let matches = 0;
   qTokensArr.forEach(t => {
@@ -327,7 +333,7 @@ function computeKeywordScore(query: string, product: { title: string; descriptio
   });
 
   // Scale by proportion of query terms matched, weighted toward title coverage
-  const queryOverlap = matches / qTokens.size;
+  const queryOverlap = matches / distinct;
   const titleOverlap = Math.min(matches, titleTokens.size) / titleTokens.size;
 
   // Combine: mostly care about query term coverage, with bonus for title coverage
@@ -343,7 +349,7 @@ function computeKeywordScore(query: string, product: { title: string; descriptio
     qTokensArr.forEach(t => {
       if (desc.includes(t)) descMatches++;
     });
-    descBonus = (descMatches / qTokens.size) * 0.05;
+    descBonus = (descMatches / distinct) * 0.05;
   }
 
   return Math.min(1.0, score * 0.7 + descBonus);
@@ -436,6 +442,15 @@ function normalizeRecencyScore(createdAt: Date): number {
   return 1 - ((daysSinceCreation - 30) / 335) * 0.9;
 }
 
+/**
+ * Round a score to the 6 decimals stored with search explanations. Scores
+ * read from Float32Array columns otherwise widen to 17-digit doubles
+ * (0.8123456835746765), which bloats every serialized search response.
+ */
+function roundScore(score: number): number {
+  return Math.round(score * 1e6) / 1e6;
+}
+
 export interface SearchResult {
   product: Product;
   scores: {
@@ -491,22 +506,26 @@ export async function semanticSearch(
     sessionId = "anonymous"
   } = options;
 
-  // Get all products, with embeddings when available
-  const productsWithEmbeddings = await getAllProductsWithOptionalEmbeddings(5000, 0);
+  // Load the catalog snapshot (products with embeddings when available) and
+  // the active ranking weights while the local model (no external service)
+  // embeds the query, so the database round-trips are in flight during
+  // inference. The model run itself is synchronous native code that blocks
+  // the event loop while it executes; it is not moved to a worker thread.
+  const [store, queryEmbedding, weights] = await Promise.all([
+    getProductStore(),
+    generateEmbedding(query),
+    getActiveRankingWeights(),
+  ]);
+  const { products } = store;
 
   // Build corpus IDF on first search if not already built
-  if (!corpusBuilt && productsWithEmbeddings.length > 0) {
-    const productTexts = productsWithEmbeddings.map(({ product }: ProductWithEmbedding) =>
+  if (!corpusBuilt && products.length > 0) {
+    const productTexts = products.map((product: Product) =>
       `${product.title} ${product.description || ""} ${product.category || ""} ${product.subcategory || ""}`
     );
     buildCorpusIDF(productTexts);
   }
 
-  // Generate query embedding using local model (no external service)
-  const queryEmbedding = await generateEmbedding(query);
-
-  // Get active ranking weights
-  const weights = await getActiveRankingWeights();
   const rawAlpha = Number(weights.alpha);
   const rawBeta = Number(weights.beta);
   const rawGamma = Number(weights.gamma);
@@ -523,95 +542,79 @@ export async function semanticSearch(
   const delta = rawDelta * scaleFactor;
   const epsilon = rawEpsilon * scaleFactor;
 
-  // Calculate price range for normalization
-  const prices = productsWithEmbeddings
-    .map((p: ProductWithEmbedding) => Number(p.product.price) || 0)
-    .filter((p: number) => p > 0);
-  const minPriceInSet = Math.min(...prices, 0);
-  const maxPriceInSet = Math.max(...prices, 1);
-
-  // Score all products with hybrid semantic + keyword ranking.
-  let scoredProducts: ScoredProduct[] = productsWithEmbeddings.map(({ product, embedding }: ProductWithEmbedding) => {
-    // Semantic score: cosine similarity between query and product embeddings.
-    let rawSemantic = 0;
-    if (Array.isArray(embedding) && embedding.length === queryEmbedding.length) {
-      rawSemantic = cosineSimilarity(queryEmbedding, embedding as number[]);
-    }
-    const semanticScore = Math.max(0, Math.min(1, rawSemantic));
-
-    const ratingScore = normalizeRatingScore(product.rating ? Number(product.rating) : null);
-    const priceScore = normalizePriceScore(
-      Number(product.price) || 0,
-      minPriceInSet,
-      maxPriceInSet
-    );
-    const stockScore = normalizeStockScore(product.availability, product.stockQuantity);
-    const recencyScore = normalizeRecencyScore(product.createdAt);
+  // Apply the filters over the store's columns, keeping only the row
+  // indices of matching products. Price normalization uses the range of the
+  // whole catalog, which the store precomputes.
+  const categoryLower = category?.toLowerCase();
+  const candidates: number[] = [];
+  const minPriceInSet = 0;
+  const maxPriceInSet = store.maxPrice;
+  for (let r = 0; r < products.length; r++) {
+    if (categoryLower && products[r].category?.toLowerCase() !== categoryLower) continue;
+    if (minPrice !== undefined && !(store.prices[r] >= minPrice)) continue;
+    if (maxPrice !== undefined && !(store.prices[r] <= maxPrice)) continue;
+    if (inStockOnly && store.availabilities[r] === AVAILABILITY_CODE.out_of_stock) continue;
+    candidates.push(r);
+  }
 
+  // Semantic scores for every candidate straight from the store's
+  // pre-normalized embedding matrix. Products without an embedding score 0.
+  const sims = matVecRows(store.embeddings, normalizeToFloat32(queryEmbedding), candidates);
+
+  const queryTerms = queryTermSet(query);
+  const keywordQuery = toKeywordQuery(query);
+
+  // Collect every ranking signal into per-factor columns, then combine them
+  // with one weighted-sum kernel instead of per-product arithmetic.
+  const n = candidates.length;
+  const semantic = clamp01(sims);
+  const rating = new Float32Array(n);
+  const price = new Float32Array(n);
+  const stock = new Float32Array(n);
+  const recency = new Float32Array(n);
+  const keyword = new Float32Array(n);
+  for (let i = 0; i < n; i++) {
+    const r = candidates[i];
+    const product = products[r];
+    rating[i] = normalizeRatingScore(Number.isNaN(store.ratings[r]) ? null : store.ratings[r]);
+    price[i] = normalizePriceScore(store.prices[r], minPriceInSet, maxPriceInSet);
+    stock[i] = normalizeStockScore(product.availability, product.stockQuantity);
+    recency[i] = normalizeRecencyScore(product.createdAt);
     // Keyword/exact-match score — purely lexical, no embedding needed.
-    const keywordScore = computeKeywordScore(query, product);
-
-    const productText = `${product.title} ${product.description || ""} ${product.category || ""}`;
-    const matchedTerms = extractMatchedTerms(query, productText);
-
-    // Weighted final score: hybrid semantic + keyword + other signals.
-    const finalScore =
-      alpha * semanticScore +
-      beta * ratingScore +
-      gamma * priceScore +
-      delta * stockScore +
-      epsilon * recencyScore +
-      KAPPA * keywordScore;
-
-    return {
-      product,
-      scores: {
-        final: finalScore,
-        semantic: semanticScore,
-        rating: ratingScore,
-        price: priceScore,
-        stock: stockScore,
-        recency: recencyScore,
-        keyword: keywordScore,
-      },
-      matchedTerms,
-      explanation: "",
-      position: 0,
-    };
-  });
-
-  // Apply filters
-  if (category) {
-    scoredProducts = scoredProducts.filter(
-      (p: ScoredProduct) => p.product.category?.toLowerCase() === category.toLowerCase()
-    );
-  }
-  if (minPrice !== undefined) {
-    scoredProducts = scoredProducts.filter(
-      (p: ScoredProduct) => Number(p.product.price) >= minPrice
-    );
-  }
-  if (maxPrice !== undefined) {
-    scoredProducts = scoredProducts.filter(
-      (p: ScoredProduct) => Number(p.product.price) <= maxPrice
-    );
-  }
-  if (inStockOnly) {
-    scoredProducts = scoredProducts.filter(
-      (p: ScoredProduct) => p.product.availability !== "out_of_stock"
-    );
+    keyword[i] = computeKeywordScore(keywordQuery, product);
   }
 
-  // Filter by minimum score and sort
-  const results = scoredProducts
-    .filter((p: ScoredProduct) => p.scores.final >= minScore)
-    .sort((a: ScoredProduct, b: ScoredProduct) => b.scores.final - a.scores.final)
-    .slice(0, limit)
-    .map((result: ScoredProduct, index: number) => ({
-      ...result,
-      position: index + 1,
-      explanation: generateExplanation(result.product, result.scores, result.matchedTerms, weights),
-    }));
+  // Weighted final score: hybrid semantic + keyword + other signals.
+  const finalScores = weightedSum(
+    [semantic, rating, price, stock, recency, keyword],
+    [alpha, beta, gamma, delta, epsilon, KAPPA],
+  );
+
+  // Filter by minimum score and take the top `limit` without a full sort.
+  // Matched terms and explanations are only built for the returned rows.
+  const results: ScoredProduct[] = topKIndices(finalScores, limit, i => finalScores[i] >= minScore)
+    .map((i: number, index: number) => {
+      const product = products[candidates[i]];
+      const productText = `${product.title} ${product.description || ""} ${product.category || ""}`;
+      const matchedTerms = extractMatchedTerms(queryTerms, productText);
+      const scores = {
+        final: roundScore(finalScores[i]),
+        semantic: roundScore(semantic[i]),
+        rating: roundScore(rating[i]),
+        price: roundScore(price[i]),
+        stock: roundScore(stock[i]),
+        recency: roundScore(recency[i]),
+        keyword: roundScore(keyword[i]),
+      };
+
+      return {
+        product,
+        scores,
+        matchedTerms,
+        explanation: generateExplanation(product, scores, matchedTerms, weights),
+        position: index + 1,
+      };
+    });
 
   const responseTimeMs = Date.now() - startTime;
 
@@ -619,7 +622,8 @@ export async function semanticSearch(
   const searchLogId = await logSearch({
     sessionId,
     query,
-    queryEmbedding,
+    // jsonb column; widen to a plain array only here, at the storage edge
+    queryEmbedding: Array.from(queryEmbedding),
     resultsCount: results.length,
     responseTimeMs,
     filters: { category, minPrice, maxPrice, inStockOnly },
@@ -686,6 +690,7 @@ export async function generateProductEmbedding(productId: number): Promise<boole
       productId,
       embedding,
       textUsed: textToEmbed.slice(0, 1000),
+      embeddingModel: localEmbedding.getEmbeddingModelId(),
     });
 
     return true;
@@ -697,6 +702,10 @@ export async function generateProductEmbedding(productId: number): Promise<boole
 
 /**
  * Batch generate embeddings for multiple products using local model.
+ *
+ * Product texts are built up front and embedded shortest first: the
+ * tokenizer pads each batch to its longest text, so batching texts of
+ * similar length spends less compute on padding.
  */
 export async function batchGenerateEmbeddings(
   productIds: number[],
@@ -704,86 +713,81 @@ export async function batchGenerateEmbeddings(
 ): Promise<{ success: number; failed: number }> {
   if (productIds.length === 0) return { success: 0, failed: 0 };
 
+  const FETCH_SIZE = 1000; // Keeps the IN (...) list well under parameter limits
   const CHUNK_SIZE = 16; // Conservative for CPU inference
   let success = 0;
   let failed = 0;
-  let completed = 0;
 
-  for (let offset = 0; offset < productIds.length; offset += CHUNK_SIZE) {
-    const chunkIds = productIds.slice(offset, offset + CHUNK_SIZE);
+  const jobs: Array<{ productId: number; text: string }> = [];
+  for (let offset = 0; offset < productIds.length; offset += FETCH_SIZE) {
+    const ids = productIds.slice(offset, offset + FETCH_SIZE);
     try {
-      const products = await getProductsByIds(chunkIds);
+      const products = await getProductsByIds(ids);
       const byId = new Map(products.map((p: Product) => [p.id, p]));
-      const texts = chunkIds.map(id => {
+      for (const id of ids) {
         const p = byId.get(id);
-        return p ? buildProductText(p) : "";
-      });
-
-      const toEmbedIndexes = texts
-        .map((t, i) => (t.trim().length > 0 ? i : -1))
-        .filter(i => i >= 0);
-      if (toEmbedIndexes.length === 0) {
-        failed += chunkIds.length;
-        completed += chunkIds.length;
-        onProgress?.(completed, productIds.length);
-        continue;
+        const text = p ? buildProductText(p) : "";
+        if (text.trim().length > 0) jobs.push({ productId: id, text });
+        else failed++;
       }
+    } catch (error) {
+      console.error("[SemanticSearch] Failed to load products for embedding, marking them as failed:", error);
+      failed += ids.length;
+    }
+  }
 
-      const filteredTexts = toEmbedIndexes.map(i => texts[i]);
+  let completed = failed;
+  if (completed > 0) onProgress?.(completed, productIds.length);
 
-      // Try batch first
-      let embeddings: number[][] | null = null;
-      try {
-        embeddings = await localEmbedding.generateBatchPassageEmbeddings(filteredTexts);
-      } catch (batchErr) {
-        console.warn("[SemanticSearch] Batch embed failed, falling back to single mode:", batchErr);
-      }
+  jobs.sort((a, b) => a.text.length - b.text.length);
+
+  for (let offset = 0; offset < jobs.length; offset += CHUNK_SIZE) {
+    const chunk = jobs.slice(offset, offset + CHUNK_SIZE);
 
-      if (embeddings) {
-        for (let k = 0; k < toEmbedIndexes.length; k++) {
-          const localIdx = toEmbedIndexes[k];
-          const productId = chunkIds[localIdx];
-          try {
-            await createEmbedding({
-              productId,
-              embedding: embeddings[k],
-              textUsed: filteredTexts[k].slice(0, 1000),
-            });
-            success++;
-          } catch (e) {
-            console.error("[SemanticSearch] Failed to store embedding for", productId, e);
-            failed++;
-          }
+    // Try batch first
+    let embeddings: Float32Array[] | null = null;
+    try {
+      embeddings = await localEmbedding.generateBatchPassageEmbeddings(chunk.map(job => job.text));
+    } catch (batchErr) {
+      console.warn("[SemanticSearch] Batch embed failed, falling back to single mode:", batchErr);
+    }
+
+    if (embeddings) {
+      for (let k = 0; k < chunk.length; k++) {
+        const { productId, text } = chunk[k];
+        try {
+          await createEmbedding({
+            productId,
+            embedding: embeddings[k],
+            textUsed: text.slice(0, 1000),
+            embeddingModel: localEmbedding.getEmbeddingModelId(),
+          });
+          success++;
+        } catch (e) {
+          console.error("[SemanticSearch] Failed to store embedding for", productId, e);
+          failed++;
         }
-      } else {
-        // Fallback: embed one product at a time
-        for (let k = 0; k < toEmbedIndexes.length; k++) {
-          const localIdx = toEmbedIndexes[k];
-          const productId = chunkIds[localIdx];
-          try {
-            const embedding = await localEmbedding.generatePassageEmbedding(filteredTexts[k]);
-            await createEmbedding({
-              productId,
-              embedding,
-              textUsed: filteredTexts[k].slice(0, 1000),
-            });
-            success++;
-          } catch (e) {
-            console.error("[SemanticSearch] Single embed failed for", productId, e);
-            failed++;
-          }
+      }
+    } else {
+      // Fallback: embed one product at a time
+      for (const { productId, text } of chunk) {
+        try {
+          const embedding = await localEmbedding.generatePassageEmbedding(text);
+          await createEmbedding({
+            productId,
+            embedding,
+            textUsed: text.slice(0, 1000),
+            embeddingModel: localEmbedding.getEmbeddingModelId(),
+          });
+          success++;
+        } catch (e) {
+          console.error("[SemanticSearch] Single embed failed for", productId, e);
+          failed++;
         }
       }
-      failed += chunkIds.length - toEmbedIndexes.length;
-    } catch (error) {
-      console.error(
-        "[SemanticSearch] Batch embedding chunk failed, marking chunk as failed:",
-        error,
-      );
-      failed += chunkIds.length;
     }
 
-    completed += chunkIds.length;
+    completed += chunk.length;
     onProgress?.(completed, productIds.length);
   }
 
@@ -0,0 +1,213 @@
+import { describe, expect, it } from "vitest";
+import {
+  buildNormalizedMatrix,
+  clamp01,
+  clearEmbeddingIndexCache,
+  decodeFloat32Base64,
+  dotAt,
+  encodeFloat32Base64,
+  getEmbeddingIndex,
+  l2Normalize,
+  matVec,
+  matVecRows,
+  normalizeToFloat32,
+  parseEmbedding,
+  searchIndex,
+  topKIndices,
+  weightedSum,
+} from "./vectorMath";
+import { cosineSimilarity } from "./semanticSearch";
+
+describe("Vector Math", () => {
+  describe("buildNormalizedMatrix", () => {
+    it("stacks vectors into unit-length rows", () => {
+      const matrix = buildNormalizedMatrix([[3, 4], [0, 2]], 2);
+
+      expect(matrix.rows).toBe(2);
+      expect(matrix.dim).toBe(2);
+      expect(matrix.data[0]).toBeCloseTo(0.6, 5);
+      expect(matrix.data[1]).toBeCloseTo(0.8, 5);
+      expect(matrix.data[2]).toBeCloseTo(0, 5);
+      expect(matrix.data[3]).toBeCloseTo(1, 5);
+    });
+
+    it("leaves missing and mismatched vectors as zero rows", () => {
+      const matrix = buildNormalizedMatrix([null, [1, 0, 0], [1, 0]], 2);
+
+      expect(Array.from(matrix.data.slice(0, 4))).toEqual([0, 0, 0, 0]);
+      expect(matrix.data[4]).toBeCloseTo(1, 5);
+    });
+  });
+
+  describe("l2Normalize", () => {
+    it("returns a unit-length plain array and leaves zero vectors at zero", () => {
+      const unit = l2Normalize([3, 4]);
+
+      expect(Array.isArray(unit)).toBe(true);
+      expect(unit[0]).toBeCloseTo(0.6, 10);
+      expect(unit[1]).toBeCloseTo(0.8, 10);
+      expect(l2Normalize([0, 0])).toEqual([0, 0]);
+    });
+  });
+
+  describe("dotAt", () => {
+    it("handles dimensions that are not a multiple of four", () => {
+      const a = new Float32Array([9, 1, 2, 3, 4, 5, 6]);
+      const b = new Float32Array([1, 1, 1, 1, 1, 2]);
+
+      // a[1..7) · b = 1 + 2 + 3 + 4 + 5 + 12
+      expect(dotAt(a, 1, b, 6)).toBe(27);
+    });
+  });
+
+  describe("matVec", () => {
+    it("returns one dot product per row", () => {
+      const matrix = buildNormalizedMatrix([[1, 0], [0, 1], [-1, 0]], 2);
+      const sims = matVec(matrix, normalizeToFloat32([1, 0]));
+
+      expect(sims[0]).toBeCloseTo(1, 5);
+      expect(sims[1]).toBeCloseTo(0, 5);
+      expect(sims[2]).toBeCloseTo(-1, 5);
+    });
+  });
+
+  describe("matVecRows", () => {
+    it("scores only the requested rows, in the requested order", () => {
+      const matrix = buildNormalizedMatrix([[1, 0], [0, 1], [-1, 0]], 2);
+      const sims = matVecRows(matrix, normalizeToFloat32([1, 0]), [2, 0]);
+
+      expect(sims.length).toBe(2);
+      expect(sims[0]).toBeCloseTo(-1, 5);
+      expect(sims[1]).toBeCloseTo(1, 5);
+    });
+  });
+
+  describe("normalized matrix similarity", () => {
+    it("matches pairwise cosineSimilarity on 384-dimensional vectors", () => {
+      const dim = 384;
+      const query = Array.from({ length: dim }, (_, i) => Math.sin(i * 0.1));
+      const vectors = [0.1, 0.5, 2].map(shift =>
+        Array.from({ length: dim }, (_, i) => Math.sin(i * 0.1 + shift))
+      );
+
+      const sims = matVec(buildNormalizedMatrix(vectors, dim), normalizeToFloat32(query));
+
+      vectors.forEach((vec, i) => {
+        expect(sims[i]).toBeCloseTo(cosineSimilarity(query, vec), 4);
+      });
+    });
+
+    it("scores zero vectors as 0", () => {
+      const sims = matVec(buildNormalizedMatrix([[0, 0, 0, 0]], 4), normalizeToFloat32([1, 0, 0, 0]));
+      expect(sims[0]).toBe(0);
+    });
+  });
+
+  describe("embedding serialization", () => {
+    it("round-trips float32 vectors through base64", () => {
+      const vec = [0.25, -1.5, 3, 0];
+      const decoded = decodeFloat32Base64(encodeFloat32Base64(vec));
+
+      expect(Array.from(decoded)).toEqual(vec);
+    });
+
+    it("parses arrays, JSON strings and base64 strings", () => {
+      const vec = [0.5, -0.5];
+
+      expect(parseEmbedding(vec)).toBe(vec);
+      expect(Array.from(parseEmbedding("[0.5,-0.5]")!)).toEqual(vec);
+      expect(Array.from(parseEmbedding(encodeFloat32Base64(vec))!)).toEqual(vec);
+      expect(parseEmbedding(null)).toBeNull();
+      expect(parseEmbedding({})).toBeNull();
+      expect(parseEmbedding("[0.5, -0.5")).toBeNull();
+    });
+  });
+
+  describe("score kernels", () => {
+    it("clamps values to [0, 1] in place", () => {
+      const values = new Float32Array([-0.5, 0.25, 1.5]);
+      expect(clamp01(values)).toBe(values);
+      expect(Array.from(values)).toEqual([0, 0.25, 1]);
+    });
+
+    it("computes the weighted ranking formula per row", () => {
+      const semantic = new Float32Array([0.8, 0.3]);
+      const rating = new Float32Array([0.9, 1.0]);
+      const price = new Float32Array([0.7, 0.5]);
+      const stock = new Float32Array([1.0, 0.5]);
+      const recency = new Float32Array([0.5, 0.5]);
+
+      const final = weightedSum(
+        [semantic, rating, price, stock, recency],
+        [0.5, 0.2, 0.15, 0.1, 0.05],
+      );
+
+      // Same case as the Weighted Ranking Formula test in semanticSearch.test.ts
+      expect(final[0]).toBeCloseTo(0.81, 5);
+      expect(final[1]).toBeCloseTo(0.15 + 0.2 + 0.075 + 0.05 + 0.025, 5);
+    });
+  });
+
+  describe("topKIndices", () => {
+    it("matches a stable descending sort", () => {
+      const scores = new Float32Array([0.2, 0.9, 0.5, 0.9, 0.1, 0.7]);
+
+      expect(topKIndices(scores, 3)).toEqual([1, 3, 5]);
+      expect(topKIndices(scores, 10)).toEqual([1, 3, 5, 2, 0, 4]);
+    });
+
+    it("only considers included indices", () => {
+      const scores = new Float32Array([0.25, 0.75, 0.5, 0.75]);
+
+      expect(topKIndices(scores, 2, i => scores[i] < 0.75)).toEqual([2, 0]);
+      expect(topKIndices(scores, 0)).toEqual([]);
+    });
+  });
+
+  describe("catalog index", () => {
+    const catalog = [
+      { id: 1, embedding: [1, 0] },
+      { id: 2, embedding: [0.6, 0.8] },
+      { id: 3, embedding: [0, 1] },
+    ];
+
+    it("loads and builds once per key", async () => {
+      clearEmbeddingIndexCache();
+      let loads = 0;
+      const load = async () => {
+        loads++;
+        return catalog;
+      };
+
+      const [first, concurrent] = await Promise.all([
+        getEmbeddingIndex("v1", 2, load),
+        getEmbeddingIndex("v1", 2, load),
+      ]);
+      expect(concurrent).toBe(first);
+      expect(await getEmbeddingIndex("v1", 2, load)).toBe(first);
+      expect(loads).toBe(1);
+
+      expect(await getEmbeddingIndex("v2", 2, load)).not.toBe(first);
+      expect(loads).toBe(2);
+    });
+
+    it("does not cache a failed load", async () => {
+      clearEmbeddingIndexCache();
+      await expect(getEmbeddingIndex("bad", 2, async () => { throw new Error("db down"); }))
+        .rejects.toThrow("db down");
+
+      const index = await getEmbeddingIndex("bad", 2, async () => catalog);
+      expect(index.ids).toEqual([1, 2, 3]);
+    });
+
+    it("returns nearest neighbours best first, skipping the excluded id", async () => {
+      const index = await getEmbeddingIndex("v1", 2, async () => catalog);
+      const hits = searchIndex(index, [1, 0], 2, 1);
+
+      expect(hits.map(h => h.id)).toEqual([2, 3]);
+      expect(hits[0].row).toBe(1);
+      expect(hits[0].sim).toBeCloseTo(0.6, 5);
+      expect(index.entries[hits[0].row]).toEqual({ id: 2 });
+    });
+  });
+});
@@ -0,0 +1,388 @@
+/**
+ * Vector math helpers for embedding scoring.
+ *
+ * Product embeddings are stacked once per request into a single contiguous,
+ * row-major Float32Array with L2-normalized rows. Scoring a query against
+ * the whole catalog is then one matrix-vector product instead of one
+ * cosine call (and two norms) per product.
+ */
+
+/** Row-major (rows × dim) matrix of L2-normalized embeddings. */
+export interface EmbeddingMatrix {
+  data: Float32Array;
+  rows: number;
+  dim: number;
+}
+
+/** Norms below this are treated as zero vectors. */
+const MIN_NORM = 1e-12;
+
+/**
+ * Return a unit-length Float32Array copy of `vec`.
+ */
+export function normalizeToFloat32(vec: ArrayLike<number>): Float32Array {
+  const out = new Float32Array(vec.length);
+  let sq = 0;
+  for (let i = 0; i < vec.length; i++) {
+    out[i] = vec[i];
+    sq += vec[i] * vec[i];
+  }
+  const inv = 1 / Math.max(Math.sqrt(sq), MIN_NORM);
+  for (let i = 0; i < out.length; i++) out[i] *= inv;
+  return out;
+}
+
+/**
+ * Return a unit-length plain-array copy of `vec`, for storage as JSON.
+ */
+export function l2Normalize(vec: ArrayLike<number>): number[] {
+  let sq = 0;
+  for (let i = 0; i < vec.length; i++) sq += vec[i] * vec[i];
+  const inv = 1 / Math.max(Math.sqrt(sq), MIN_NORM);
+  return Array.from(vec, v => v * inv);
+}
+
+/**
+ * Stack `vectors` into a contiguous matrix and L2-normalize every row.
+ *
+ * Missing vectors, or vectors whose length differs from `dim`, become zero
+ * rows so they score 0 against any query (same as a dimension mismatch in
+ * cosineSimilarity).
+ */
+export function buildNormalizedMatrix(
+  vectors: ReadonlyArray<ArrayLike<number> | null | undefined>,
+  dim: number,
+): EmbeddingMatrix {
+  const rows = vectors.length;
+  const data = new Float32Array(rows * dim);
+
+  for (let r = 0; r < rows; r++) {
+    const vec = vectors[r];
+    if (!vec || vec.length !== dim) continue;
+
+    const offset = r * dim;
+    let sq = 0;
+    for (let i = 0; i < dim; i++) {
+      data[offset + i] = vec[i];
+      sq += vec[i] * vec[i];
+    }
+    const inv = 1 / Math.max(Math.sqrt(sq), MIN_NORM);
+    for (let i = 0; i < dim; i++) data[offset + i] *= inv;
+  }
+
+  return { data, rows, dim };
+}
+
+/**
+ * Dot product of `a[aOffset .. aOffset + dim)` with `b[0 .. dim)`.
+ *
+ * Unrolled by four with independent accumulators so the JIT can keep
+ * several multiply-adds in flight instead of serialising on one sum.
+ */
+export function dotAt(a: Float32Array, aOffset: number, b: Float32Array, dim: number): number {
+  let s0 = 0, s1 = 0, s2 = 0, s3 = 0;
+  const end4 = dim - (dim % 4);
+  let i = 0;
+  for (; i < end4; i += 4) {
+    const j = aOffset + i;
+    s0 += a[j] * b[i];
+    s1 += a[j + 1] * b[i + 1];
+    s2 += a[j + 2] * b[i + 2];
+    s3 += a[j + 3] * b[i + 3];
+  }
+  for (; i < dim; i++) s0 += a[aOffset + i] * b[i];
+  return (s0 + s1) + (s2 + s3);
+}
+
+/**
+ * Compute `matrix @ query` — one dot product per row.
+ *
+ * With normalized rows and a normalized query this is the cosine similarity
+ * of the query against every row.
+ */
+export function matVec(matrix: EmbeddingMatrix, query: Float32Array): Float32Array {
+  const { data, rows, dim } = matrix;
+  const out = new Float32Array(rows);
+  if (query.length !== dim) return out;
+
+  for (let r = 0; r < rows; r++) {
+    out[r] = dotAt(data, r * dim, query, dim);
+  }
+  return out;
+}
+
+/**
+ * Like `matVec`, but only for the given `rows` (e.g. the rows left after
+ * filtering). `out[i]` is the dot product of row `rows[i]` with `query`.
+ */
+export function matVecRows(
+  matrix: EmbeddingMatrix,
+  query: Float32Array,
+  rows: ArrayLike<number>,
+): Float32Array {
+  const { data, dim } = matrix;
+  const out = new Float32Array(rows.length);
+  if (query.length !== dim) return out;
+
+  for (let i = 0; i < rows.length; i++) {
+    out[i] = dotAt(data, rows[i] * dim, query, dim);
+  }
+  return out;
+}
+
+// ============================================================================
+// Score kernels
+// ============================================================================
+
+/**
+ * Clamp every value to [0, 1] in place.
+ */
+export function clamp01(values: Float32Array): Float32Array {
+  for (let i = 0; i < values.length; i++) {
+    const v = values[i];
+    values[i] = v < 0 ? 0 : v > 1 ? 1 : v;
+  }
+  return values;
+}
+
+/**
+ * Weighted sum of equal-length score columns: out[i] = Σ weights[c] × columns[c][i].
+ *
+ * Runs one tight loop per column over typed arrays, which V8 compiles to
+ * straight-line float code — no per-product objects or closures.
+ */
+export function weightedSum(
+  columns: ReadonlyArray<Float32Array>,
+  weights: ReadonlyArray<number>,
+): Float32Array {
+  const n = columns.length > 0 ? columns[0].length : 0;
+  const out = new Float32Array(n);
+  for (let c = 0; c < columns.length; c++) {
+    const col = columns[c];
+    const w = weights[c];
+    if (w === 0) continue;
+    for (let i = 0; i < n; i++) out[i] += w * col[i];
+  }
+  return out;
+}
+
+// ============================================================================
+// Top-K selection
+// ============================================================================
+
+/**
+ * Indices of the `k` highest `scores`, best first, optionally restricted to
+ * indices for which `include(i)` is true.
+ *
+ * Uses a size-k min-heap — O(N log k) instead of sorting all N entries when
+ * only the first page of results is returned. Ties keep the lower index
+ * first, matching a stable descending sort.
+ */
+export function topKIndices(
+  scores: ArrayLike<number>,
+  k: number,
+  include?: (index: number) => boolean,
+): number[] {
+  if (k <= 0) return [];
+
+  // `worse(a, b)`: a ranks below b
+  const worse = (a: number, b: number) =>
+    scores[a] < scores[b] || (scores[a] === scores[b] && a > b);
+
+  // Min-heap of the best k seen so far; heap[0] is the worst of them
+  const heap: number[] = [];
+
+  const siftDown = (start: number) => {
+    let i = start;
+    for (;;) {
+      const l = 2 * i + 1;
+      const r = l + 1;
+      let m = i;
+      if (l < heap.length && worse(heap[l], heap[m])) m = l;
+      if (r < heap.length && worse(heap[r], heap[m])) m = r;
+      if (m === i) return;
+      [heap[i], heap[m]] = [heap[m], heap[i]];
+      i = m;
+    }
+  };
+
+  for (let idx = 0; idx < scores.length; idx++) {
+    if (include && !include(idx)) continue;
+
+    if (heap.length < k) {
+      // Sift up
+      heap.push(idx);
+      let i = heap.length - 1;
+      while (i > 0) {
+        const parent = (i - 1) >> 1;
+        if (!worse(heap[i], heap[parent])) break;
+        [heap[i], heap[parent]] = [heap[parent], heap[i]];
+        i = parent;
+      }
+    } else if (worse(heap[0], idx)) {
+      heap[0] = idx;
+      siftDown(0);
+    }
+  }
+
+  return heap.sort((a, b) => (worse(a, b) ? 1 : worse(b, a) ? -1 : 0));
+}
+
+// ============================================================================
+// Cached catalog index
+// ============================================================================
+
+/** A catalog's embeddings, normalized once and reused across requests. */
+export interface EmbeddingIndex<T extends IndexEntry = IndexEntry> {
+  key: string;
+  ids: number[];
+  /** The entries the index was built from, without their raw embeddings. */
+  entries: Omit<T, "embedding">[];
+  matrix: EmbeddingMatrix;
+  builtAt: number;
+}
+
+export interface IndexEntry {
+  id: number;
+  embedding?: ArrayLike<number> | null;
+}
+
+export interface IndexHit {
+  /** Row in the entries the index was built from. */
+  row: number;
+  id: number;
+  sim: number;
+}
+
+const INDEX_CACHE_MAX_SIZE = 4;
+
+/**
+ * Upper bound on index age. Callers key the cache on a version that changes
+ * with every write they can see; this covers writes made by other processes.
+ */
+const INDEX_MAX_AGE_MS = 5 * 60 * 1000;
+
+const indexCache = new Map<string, Promise<EmbeddingIndex<any>>>();
+
+/**
+ * Build an index over `entries` (rows line up with `entries`; missing
+ * embeddings become zero rows).
+ */
+export function buildEmbeddingIndex<T extends IndexEntry>(
+  key: string,
+  entries: ReadonlyArray<T>,
+  dim: number,
+): EmbeddingIndex<T> {
+  return {
+    key,
+    ids: entries.map(e => e.id),
+    entries: entries.map(({ embedding: _embedding, ...rest }) => rest),
+    matrix: buildNormalizedMatrix(entries.map(e => e.embedding), dim),
+    builtAt: Date.now(),
+  };
+}
+
+/**
+ * Return the index cached under `key`, calling `load()` and building it
+ * only on a miss. Key on something that changes whenever the catalog does
+ * (e.g. db.ts's catalog version) so an unchanged catalog is neither
+ * refetched nor re-normalized. Concurrent misses share one load; a failed
+ * load is not cached.
+ */
+export async function getEmbeddingIndex<T extends IndexEntry>(
+  key: string,
+  dim: number,
+  load: () => Promise<ReadonlyArray<T>>,
+): Promise<EmbeddingIndex<T>> {
+  const cacheKey = `${dim}:${key}`;
+  const cached = indexCache.get(cacheKey) as Promise<EmbeddingIndex<T>> | undefined;
+  if (cached) {
+    const index = await cached;
+    if (Date.now() - index.builtAt < INDEX_MAX_AGE_MS) return index;
+    if (indexCache.get(cacheKey) === cached) indexCache.delete(cacheKey);
+    return getEmbeddingIndex(key, dim, load);
+  }
+
+  const building = load().then(entries => buildEmbeddingIndex(cacheKey, entries, dim));
+  if (indexCache.size >= INDEX_CACHE_MAX_SIZE) {
+    indexCache.delete(indexCache.keys().next().value as string);
+  }
+  indexCache.set(cacheKey, building);
+  building.catch(() => {
+    if (indexCache.get(cacheKey) === building) indexCache.delete(cacheKey);
+  });
+  return building;
+}
+
+/**
+ * Drop every cached catalog index.
+ */
+export function clearEmbeddingIndexCache(): number {
+  const entries = indexCache.size;
+  indexCache.clear();
+  return entries;
+}
+
+/**
+ * The `limit` rows most similar to `query`, best first, skipping `excludeId`.
+ */
+export function searchIndex(
+  index: EmbeddingIndex,
+  query: ArrayLike<number>,
+  limit: number,
+  excludeId?: number,
+): IndexHit[] {
+  const sims = matVec(index.matrix, normalizeToFloat32(query));
+  const rows = topKIndices(sims, limit, r => index.ids[r] !== excludeId);
+  return rows.map(row => ({ row, id: index.ids[row], sim: sims[row] }));
+}
+
+// ============================================================================
+// Embedding (de)serialization
+// ============================================================================
+
+/**
+ * Encode a vector as base64 little-endian float32 — 4 bytes per value
+ * instead of a ~20-character JSON number.
+ */
+export function encodeFloat32Base64(vec: ArrayLike<number>): string {
+  const f32 = vec instanceof Float32Array ? vec : Float32Array.from(vec);
+  return Buffer.from(f32.buffer, f32.byteOffset, f32.byteLength).toString("base64");
+}
+
+/**
+ * Decode a base64 float32 vector produced by encodeFloat32Base64.
+ */
+export function decodeFloat32Base64(b64: string): Float32Array {
+  const bytes = Buffer.from(b64, "base64");
+  // Copy into a fresh, 4-byte aligned buffer (Buffer pools are not aligned)
+  const out = new Float32Array(bytes.byteLength >> 2);
+  new Uint8Array(out.buffer).set(bytes.subarray(0, out.byteLength));
+  return out;
+}
+
+/**
+ * Accept an embedding in any stored/wire form — a number array, a
+ * Float32Array, a JSON array string, or a base64 float32 string — and
+ * return it without building an intermediate array of JS numbers for the
+ * base64 case. Returns null for anything else, including malformed JSON,
+ * so one bad row scores 0 instead of failing the whole catalog load.
+ */
+export function parseEmbedding(raw: unknown): ArrayLike<number> | null {
+  if (raw == null) return null;
+  if (Array.isArray(raw) || raw instanceof Float32Array) return raw;
+  if (typeof raw === "string") {
+    const trimmed = raw.trim();
+    if (trimmed.length === 0) return null;
+    if (trimmed[0] === "[") {
+      try {
+        const parsed = JSON.parse(trimmed);
+        return Array.isArray(parsed) ? parsed : null;
+      } catch {
+        return null;
+      }
+    }
+    return decodeFloat32Base64(trimmed);
+  }
+  return null;
+}